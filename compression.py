@@ -0,0 +1,49 @@
+import gzip
+import zlib
+
+# brotli — необязательная зависимость: без неё используется только gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def supported_encodings():
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+# Выбор кодировки по заголовку Accept-Encoding (с учётом q-значений)
+def choose_encoding(accept_encodings):
+    return accept_encodings.best_match(supported_encodings())
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    raise ValueError(f'Неподдерживаемая кодировка: {encoding}')
+
+
+# Потоковое сжатие: куски отдаются по мере поступления, без буферизации всего ответа
+def compress_stream(chunks, encoding):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            data = compressor.process(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+    elif encoding == 'gzip':
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            # Сбрасываем буфер на каждом куске, чтобы клиент получал данные сразу
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+    else:
+        raise ValueError(f'Неподдерживаемая кодировка: {encoding}')
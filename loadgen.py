@@ -0,0 +1,379 @@
+import argparse
+import json
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+# Генератор смешанной нагрузки для PhoneBook API: поиск по мере набора,
+# добавление и удаление, переключение избранного и перетаскивание контактов.
+# Работает внутри процесса через тестовый клиент Flask или с запущенным сервером по URL.
+# Изменяет только контакты, которые создал сам, и по окончании удаляет их.
+
+DEFAULT_MIX = 'search=70,add=10,delete=5,favorite=10,reorder=5'
+OPERATIONS = ('search', 'add', 'delete', 'favorite', 'reorder')
+FIRST_NAMES = ['Иван', 'Пётр', 'Мария', 'Анна', 'Сергей', 'Ольга', 'Дмитрий', 'Елена',
+               'Алексей', 'Наталья', 'Михаил', 'Татьяна', 'Andrew', 'Julia']
+LAST_NAMES = ['Иванов', 'Петров', 'Сидорова', 'Козлова', 'Смирнов', 'Кузнецова',
+              'Попов', 'Волкова', 'Соколов', 'Морозова', 'Smith', 'Brown']
+LOCKED_MARKER = 'database is locked'
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f'Неизвестная операция: {name}')
+        mix[name] = float(weight) if weight else 1.0
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError('Смесь операций пуста')
+    return mix
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+# Клиент внутри процесса: отдельный тестовый клиент Flask на каждый поток
+class InProcessClient:
+    def __init__(self, app, rate_limiter=None):
+        self.app = app
+        self.rate_limiter = rate_limiter
+        self._local = threading.local()
+
+    # Предварительное заполнение не должно расходовать лимиты замеряемой нагрузки
+    def reset_limits(self):
+        if self.rate_limiter is not None:
+            self.rate_limiter.reset()
+
+    def request(self, method, path, body=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        kwargs = {}
+        if body is not None:
+            kwargs = {'data': json.dumps(body), 'content_type': 'application/json'}
+        response = client.open(path, method=method, **kwargs)
+        return response.status_code, response.get_data(as_text=True)
+
+
+# Клиент для запущенного сервера по HTTP
+class HttpClient:
+    def __init__(self, base_url, timeout=10.0):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def request(self, method, path, body=None):
+        data = None
+        headers = {}
+        if body is not None:
+            data = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                return response.status, response.read().decode('utf-8')
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode('utf-8', errors='replace')
+        except (urllib.error.URLError, OSError) as e:
+            return 0, str(e)
+
+
+# Статистика по каждой операции: задержки, ошибки, ответы 429/503 и блокировки SQLite
+class LoadStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.endpoints = {}
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def record(self, name, seconds, status, body):
+        with self._lock:
+            entry = self.endpoints.get(name)
+            if entry is None:
+                entry = self.endpoints[name] = {
+                    'latencies': [], 'errors': 0, 'throttled': 0, 'locked': 0, 'statuses': {},
+                }
+            entry['latencies'].append(seconds)
+            entry['statuses'][status] = entry['statuses'].get(status, 0) + 1
+            if status in (429, 503):
+                entry['throttled'] += 1
+            elif not 200 <= status < 300:
+                entry['errors'] += 1
+            if LOCKED_MARKER in body:
+                entry['locked'] += 1
+
+    def summary(self):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        result = {'seconds': round(elapsed, 3), 'endpoints': {}}
+        total = 0
+        for name, entry in sorted(self.endpoints.items()):
+            latencies = sorted(entry['latencies'])
+            count = len(latencies)
+            total += count
+            result['endpoints'][name] = {
+                'count': count,
+                'errors': entry['errors'],
+                'error_rate': round(entry['errors'] / count, 4) if count else 0.0,
+                'throttled': entry['throttled'],
+                'locked': entry['locked'],
+                'statuses': {str(status): n for status, n in sorted(entry['statuses'].items())},
+                'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+                'p90_ms': round(percentile(latencies, 90) * 1000, 3),
+                'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+                'max_ms': round(latencies[-1] * 1000, 3),
+            }
+        result['requests'] = total
+        result['requests_per_second'] = round(total / elapsed, 2) if elapsed > 0 else None
+        return result
+
+
+# Состояние одного виртуального пользователя
+class Worker:
+    def __init__(self, client, stats, known_ids, ids_lock, rng):
+        self.client = client
+        self.stats = stats
+        self.known_ids = known_ids
+        self.ids_lock = ids_lock
+        self.rng = rng
+        self.typing = ''
+        self.typed = 0
+
+    def call(self, name, method, path, body=None):
+        started = time.perf_counter()
+        status, text = self.client.request(method, path, body)
+        self.stats.record(name, time.perf_counter() - started, status, text)
+        return status, text
+
+    def random_contact(self):
+        name = f'{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}'
+        digits = ''.join(str(self.rng.randint(0, 9)) for _ in range(10))
+        phone = f'+7 ({digits[:3]}) {digits[3:6]}-{digits[6:8]}-{digits[8:]}'
+        return {'name': name, 'phone': phone, 'is_favorite': self.rng.random() < 0.1}
+
+    def pick_id(self, remove=False):
+        with self.ids_lock:
+            if not self.known_ids:
+                return None
+            index = self.rng.randrange(len(self.known_ids))
+            if remove:
+                # Удаление за O(1): на место выбранного ставим последний элемент
+                picked = self.known_ids[index]
+                self.known_ids[index] = self.known_ids[-1]
+                self.known_ids.pop()
+                return picked
+            return self.known_ids[index]
+
+    # Каждая операция поиска — следующее нажатие клавиши в поле поиска
+    def search(self):
+        if self.typed >= len(self.typing):
+            self.typing = self.rng.choice(FIRST_NAMES + LAST_NAMES).lower()
+            self.typed = 0
+        self.typed += 1
+        query = urllib.parse.quote(self.typing[:self.typed])
+        self.call('search', 'GET', f'/api/contacts?search={query}')
+
+    def add(self):
+        status, text = self.call('add', 'POST', '/api/contacts', self.random_contact())
+        if status == 201:
+            with self.ids_lock:
+                self.known_ids.append(json.loads(text)['id'])
+
+    def delete(self):
+        contact_id = self.pick_id(remove=True)
+        if contact_id is None:
+            return self.add()
+        self.call('delete', 'DELETE', f'/api/contacts/{contact_id}')
+
+    # ID на время запроса забирается из общего пула, чтобы другой поток не удалил его,
+    # и возвращается обратно после ответа
+    def favorite(self):
+        contact_id = self.pick_id(remove=True)
+        if contact_id is None:
+            return self.add()
+        status, _ = self.call('favorite', 'PUT', f'/api/contacts/{contact_id}/favorite')
+        if status != 404:
+            with self.ids_lock:
+                self.known_ids.append(contact_id)
+
+    # Перетаскивание: загрузить список, переместить один контакт, отправить новый порядок.
+    # В новый порядок входят только свои контакты, чтобы не трогать order_index чужих.
+    def reorder(self):
+        status, text = self.call('list', 'GET', '/api/contacts')
+        if status != 200:
+            return
+        with self.ids_lock:
+            own = set(self.known_ids)
+        ids = [contact['id'] for contact in json.loads(text) if contact['id'] in own]
+        if len(ids) < 2:
+            return self.add()
+        moved = ids.pop(self.rng.randrange(len(ids)))
+        ids.insert(self.rng.randrange(len(ids) + 1), moved)
+        self.call('reorder', 'PUT', '/api/contacts/order', {'contact_ids': ids})
+
+
+# Удаление созданных генератором контактов; при 429/503 запрос повторяется
+def delete_contacts(client, contact_ids, attempts=5, pause=1.0):
+    if hasattr(client, 'reset_limits'):
+        client.reset_limits()
+    for contact_id in contact_ids:
+        for attempt in range(attempts):
+            status, _ = client.request('DELETE', f'/api/contacts/{contact_id}')
+            if status not in (429, 503) or attempt == attempts - 1:
+                break
+            time.sleep(pause)
+
+
+def run_load(client, mix, concurrency=4, requests=None, duration=None, rate=0.0,
+             prefill=0, seed=None, cleanup=True):
+    if requests is None and duration is None:
+        raise ValueError('Нужно задать requests или duration')
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    known_ids = []
+    ids_lock = threading.Lock()
+    master_rng = random.Random(seed)
+
+    try:
+        setup = Worker(client, LoadStats(), known_ids, ids_lock, random.Random(master_rng.random()))
+        for _ in range(prefill):
+            setup.add()
+        if prefill and hasattr(client, 'reset_limits'):
+            client.reset_limits()
+
+        stats = LoadStats()
+        ticket_lock = threading.Lock()
+        issued = [0]
+        deadline = stats.started + duration if duration is not None else None
+
+        # Выдача номера очередной операции; при заданной частоте — с ожиданием её времени
+        def next_ticket():
+            with ticket_lock:
+                if requests is not None and issued[0] >= requests:
+                    return False
+                ticket = issued[0]
+                issued[0] += 1
+            if rate:
+                delay = stats.started + ticket / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            return deadline is None or time.perf_counter() < deadline
+
+        def worker_loop(worker):
+            while next_ticket():
+                operation = worker.rng.choices(names, weights)[0]
+                getattr(worker, operation)()
+
+        threads = []
+        for _ in range(concurrency):
+            worker = Worker(client, stats, known_ids, ids_lock, random.Random(master_rng.random()))
+            thread = threading.Thread(target=worker_loop, args=(worker,), daemon=True)
+            threads.append(thread)
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats.finished = time.perf_counter()
+        return stats
+    finally:
+        # Созданные контакты удаляются, даже если замер прерван
+        if cleanup:
+            with ids_lock:
+                created = list(known_ids)
+                known_ids.clear()
+            delete_contacts(client, created)
+
+
+def format_report(summary):
+    lines = [
+        f" Запросов: {summary['requests']} за {summary['seconds']} с "
+        f"({summary['requests_per_second']} запр/с)",
+        f" {'операция':<10}{'кол-во':>8}{'ошибки':>8}{'доля':>8}{'429/503':>9}{'locked':>8}"
+        f"{'p50 мс':>10}{'p90 мс':>10}{'p99 мс':>10}{'max мс':>10}",
+    ]
+    for name, entry in summary['endpoints'].items():
+        lines.append(
+            f" {name:<10}{entry['count']:>8}{entry['errors']:>8}{entry['error_rate']:>8.2%}"
+            f"{entry['throttled']:>9}{entry['locked']:>8}{entry['p50_ms']:>10.2f}"
+            f"{entry['p90_ms']:>10.2f}{entry['p99_ms']:>10.2f}{entry['max_ms']:>10.2f}")
+    return '\n'.join(lines)
+
+
+# Клиент внутри процесса работает с отдельной базой или отдельным хранилищем в памяти
+# без файла снимка, чтобы не трогать phonebook.db и phonebook.snapshot.json
+def make_in_process_client(db_path, disable_limits):
+    import server
+    from storage import MemoryRepository
+    server.DB_PATH = db_path
+    if isinstance(server.repository, MemoryRepository):
+        server.repository = MemoryRepository()
+    if disable_limits:
+        server.RATE_LIMITING_ENABLED = False
+    server.init_db()
+    return InProcessClient(server.app, server.rate_limiter)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Генератор смешанной нагрузки для PhoneBook API')
+    parser.add_argument('--url', help='Адрес запущенного сервера, например http://127.0.0.1:5000; '
+                                      'без него нагрузка идёт через тестовый клиент Flask')
+    parser.add_argument('--db', help='Файл базы для режима внутри процесса (по умолчанию временный)')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Веса операций (по умолчанию {DEFAULT_MIX})')
+    parser.add_argument('--concurrency', type=int, default=4, help='Число параллельных клиентов')
+    parser.add_argument('--requests', type=int, help='Общее число операций')
+    parser.add_argument('--duration', type=float, help='Длительность в секундах')
+    parser.add_argument('--rate', type=float, default=0.0, help='Операций в секунду на всех клиентов (0 — без ограничения)')
+    parser.add_argument('--prefill', type=int, default=100, help='Сколько контактов добавить до замеров')
+    parser.add_argument('--seed', type=int, help='Зерно генератора случайных чисел')
+    parser.add_argument('--no-limits', action='store_true', help='Отключить ограничение частоты в режиме внутри процесса')
+    parser.add_argument('--keep-contacts', action='store_true', help='Не удалять созданные контакты после замеров')
+    parser.add_argument('--json', action='store_true', help='Вывести отчёт в JSON')
+    args = parser.parse_args(argv)
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.requests is None and args.duration is None:
+        args.duration = 10.0
+
+    temp_path = None
+    if args.url:
+        client = HttpClient(args.url)
+    else:
+        db_path = args.db
+        if db_path is None:
+            fd, temp_path = tempfile.mkstemp(suffix='.db')
+            os.close(fd)
+            db_path = temp_path
+        client = make_in_process_client(db_path, args.no_limits)
+
+    try:
+        stats = run_load(client, mix, concurrency=args.concurrency, requests=args.requests,
+                         duration=args.duration, rate=args.rate, prefill=args.prefill, seed=args.seed,
+                         cleanup=not args.keep_contacts)
+    finally:
+        if temp_path is not None:
+            os.unlink(temp_path)
+
+    summary = stats.summary()
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    else:
+        print(format_report(summary))
+
+
+if __name__ == '__main__':
+    main()
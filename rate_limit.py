@@ -0,0 +1,146 @@
+import collections
+import math
+import threading
+import time
+
+
+# Ведро токенов: rate токенов в секунду, не больше burst в запасе
+class TokenBucket:
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Возвращает 0, если токен взят, иначе сколько секунд ждать до следующего
+    def take(self, now):
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def is_full(self, now):
+        self._refill(now)
+        return self.tokens >= self.burst
+
+
+# Ограничение частоты запросов по клиенту и классу маршрута
+class RateLimiter:
+    def __init__(self, limits, max_buckets=10000, clock=time.monotonic):
+        # limits: {класс маршрута: (токенов в секунду, размер запаса)}; частота 0 — без ограничения
+        self.limits = {}
+        for route_class, (rate, burst) in limits.items():
+            if rate < 0:
+                raise ValueError(f'Частота для {route_class} не может быть отрицательной: {rate}')
+            if rate == 0:
+                continue
+            if burst < 1:
+                raise ValueError(f'Запас для {route_class} должен быть не меньше 1: {burst}')
+            self.limits[route_class] = (rate, burst)
+        self.max_buckets = max_buckets
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self.rejected = collections.Counter()
+        self.allowed = collections.Counter()
+
+    # Возвращает 0, если запрос разрешён, иначе рекомендуемую паузу в секундах
+    def check(self, client, route_class):
+        limit = self.limits.get(route_class)
+        if limit is None:
+            return 0.0
+        rate, burst = limit
+        now = self.clock()
+        key = (client, route_class)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_buckets:
+                    self._prune(now)
+                bucket = self._buckets[key] = TokenBucket(rate, burst, now)
+            wait = bucket.take(now)
+            if wait:
+                self.rejected[route_class] += 1
+            else:
+                self.allowed[route_class] += 1
+            return wait
+
+    # Полные вёдра ничем не отличаются от новых, их можно выбросить
+    def _prune(self, now):
+        for key in [key for key, bucket in self._buckets.items() if bucket.is_full(now)]:
+            del self._buckets[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'limits': {name: {'rate': rate, 'burst': burst} for name, (rate, burst) in self.limits.items()},
+                'allowed': dict(self.allowed),
+                'rejected': dict(self.rejected),
+                'clients': len(self._buckets),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+            self.allowed.clear()
+            self.rejected.clear()
+
+
+# Ограничение числа одновременных обращений к хранилищу.
+# Лишние запросы ждут не дольше wait секунд, затем получают отказ.
+# max_concurrent = 0 — без ограничения.
+class ConcurrencyLimiter:
+    def __init__(self, max_concurrent, wait=0.0):
+        if max_concurrent < 0:
+            raise ValueError(f'Число одновременных запросов не может быть отрицательным: {max_concurrent}')
+        if wait < 0:
+            raise ValueError(f'Время ожидания не может быть отрицательным: {wait}')
+        self.max_concurrent = max_concurrent
+        self.wait = wait
+        self._semaphore = threading.BoundedSemaphore(max_concurrent) if max_concurrent else None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.admitted = 0
+        self.shed = 0
+
+    def acquire(self):
+        if self._semaphore is None:
+            acquired = True
+        elif self.wait > 0:
+            acquired = self._semaphore.acquire(timeout=self.wait)
+        else:
+            acquired = self._semaphore.acquire(blocking=False)
+        with self._lock:
+            if acquired:
+                self.in_flight += 1
+                self.admitted += 1
+            else:
+                self.shed += 1
+        return acquired
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_concurrent': self.max_concurrent,
+                'wait': self.wait,
+                'in_flight': self.in_flight,
+                'admitted': self.admitted,
+                'shed': self.shed,
+            }
+
+
+def retry_after_seconds(wait):
+    return max(1, math.ceil(wait))
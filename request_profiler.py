@@ -0,0 +1,177 @@
+import cProfile
+import collections
+import io
+import itertools
+import marshal
+import pstats
+import threading
+import time
+
+
+# Хранилище последних профилей запросов (кольцевой буфер)
+class ProfileStore:
+    def __init__(self, keep=20):
+        self._lock = threading.Lock()
+        self._profiles = collections.deque(maxlen=keep)
+        self._ids = itertools.count(1)
+
+    def add(self, method, path, status, seconds, profiler):
+        stats = pstats.Stats(profiler)
+        entry = {
+            'id': next(self._ids),
+            'method': method,
+            'path': path,
+            'status': status,
+            'seconds': round(seconds, 6),
+            'timestamp': time.time(),
+            'stats': stats,
+        }
+        with self._lock:
+            self._profiles.append(entry)
+        return entry['id']
+
+    def list(self):
+        with self._lock:
+            entries = list(self._profiles)
+        return [{key: value for key, value in entry.items() if key != 'stats'}
+                for entry in reversed(entries)]
+
+    def get(self, profile_id):
+        with self._lock:
+            for entry in self._profiles:
+                if entry['id'] == profile_id:
+                    return entry
+        return None
+
+    def resize(self, keep):
+        with self._lock:
+            self._profiles = collections.deque(self._profiles, maxlen=keep)
+
+    def clear(self):
+        with self._lock:
+            self._profiles.clear()
+
+
+profile_store = ProfileStore()
+
+
+# Бинарный дамп в формате pstats (совместим с pstats.Stats, snakeviz и т.п.)
+def to_pstats(stats):
+    return marshal.dumps(stats.stats)
+
+
+# Текстовый отчёт pstats, отсортированный по накопленному времени
+def to_text(stats, limit=50):
+    buffer = io.StringIO()
+    report = pstats.Stats(stream=buffer)
+    report.add(stats)
+    report.sort_stats('cumulative').print_stats(limit)
+    return buffer.getvalue()
+
+
+def _func_label(func):
+    filename, line, name = func
+    if filename == '~':
+        return name
+    return f'{name} ({filename}:{line})'
+
+
+# Свёрнутые стеки для flamegraph.pl / speedscope.
+# cProfile хранит только пары вызывающий-вызываемый, поэтому время вызываемой
+# функции распределяется по путям пропорционально времени каждого ребра.
+def to_collapsed(stats):
+    raw = stats.stats
+    children = collections.defaultdict(list)
+    roots = []
+    for func, (cc, nc, tt, ct, callers) in raw.items():
+        if not callers:
+            roots.append(func)
+        for caller in callers:
+            children[caller].append(func)
+
+    totals = collections.defaultdict(float)
+
+    def walk(func, stack, scale):
+        cc, nc, tt, ct, callers = raw[func]
+        stack = stack + [func]
+        totals[tuple(stack)] += tt * scale
+        for callee in children[func]:
+            if callee in stack:
+                continue
+            callee_ct = raw[callee][3]
+            edge_ct = raw[callee][4][func][3]
+            # Пути короче микросекунды отбрасываются, чтобы обход не рос экспоненциально
+            if callee_ct > 0 and edge_ct * scale >= 1e-6:
+                walk(callee, stack, scale * edge_ct / callee_ct)
+
+    for root in roots:
+        walk(root, [], 1.0)
+
+    lines = []
+    for stack, seconds in totals.items():
+        microseconds = int(round(seconds * 1_000_000))
+        if microseconds > 0:
+            lines.append(';'.join(_func_label(func) for func in stack) + f' {microseconds}')
+    return '\n'.join(sorted(lines)) + '\n'
+
+
+# WSGI-обёртка: профилирует запросы с заголовком X-Profile или каждый N-й запрос.
+# Устанавливается только при включённом профилировании, иначе не стоит ничего.
+# Одновременно профилируется только один запрос: с Python 3.12 второй cProfile
+# в процессе не запускается, поэтому остальные обслуживаются без профилирования.
+class ProfilingMiddleware:
+    def __init__(self, wsgi_app, store, sample_every=0, token=None, skip_prefix=None):
+        self.wsgi_app = wsgi_app
+        self.store = store
+        self.sample_every = sample_every
+        self.token = token
+        self.skip_prefix = skip_prefix
+        self._counter = itertools.count(1)
+        self._active = threading.Lock()
+        self.skipped = 0
+
+    def _should_profile(self, environ):
+        path = environ.get('PATH_INFO', '')
+        if self.skip_prefix and path.startswith(self.skip_prefix):
+            return False
+        if environ.get('HTTP_X_PROFILE') == '1':
+            if not self.token or environ.get('HTTP_X_ADMIN_TOKEN') == self.token:
+                return True
+        return bool(self.sample_every) and next(self._counter) % self.sample_every == 0
+
+    def __call__(self, environ, start_response):
+        if not self._should_profile(environ):
+            return self.wsgi_app(environ, start_response)
+
+        if not self._active.acquire(blocking=False):
+            self.skipped += 1
+            return self.wsgi_app(environ, start_response)
+        try:
+            return self._profile(environ, start_response)
+        finally:
+            self._active.release()
+
+    def _profile(self, environ, start_response):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Профилировщик уже запущен другим инструментом (например, sys.monitoring)
+            self.skipped += 1
+            return self.wsgi_app(environ, start_response)
+
+        status_holder = []
+
+        def capture_start_response(status, headers, exc_info=None):
+            status_holder.append(int(status.split(' ', 1)[0]))
+            return start_response(status, headers, exc_info)
+
+        started = time.perf_counter()
+        try:
+            response = self.wsgi_app(environ, capture_start_response)
+        finally:
+            profiler.disable()
+            seconds = time.perf_counter() - started
+            self.store.add(environ.get('REQUEST_METHOD'), environ.get('PATH_INFO'),
+                           status_holder[0] if status_holder else None, seconds, profiler)
+        return response
@@ -1,9 +1,21 @@
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, g, jsonify, request, send_from_directory
 from flask_cors import CORS
 from flasgger import Swagger
 import sqlite3
+import argparse
+import atexit
+import functools
+import hashlib
+import threading
+import time
 import re
 import os
+import sys
+from slow_query import TimedConnection, slow_query_log
+from compression import choose_encoding, compress, compress_stream, supported_encodings
+from rate_limit import ConcurrencyLimiter, RateLimiter, retry_after_seconds
+from storage import MemoryRepository, SQLiteRepository
+from request_profiler import ProfilingMiddleware, profile_store, to_collapsed, to_pstats, to_text
 
 # Создание папки static 
 if not os.path.exists('static'):
@@ -12,6 +24,44 @@ if not os.path.exists('static'):
 app = Flask(__name__, static_folder='static')
 CORS(app)
 
+DB_PATH = 'phonebook.db'
+BACKUP_DIR = 'backups'
+# Параметры онлайн-бэкапа: сколько страниц копировать за шаг и пауза между шагами
+BACKUP_PAGES_PER_STEP = 1024
+BACKUP_STEP_SLEEP = 0.005
+# Запись в базу другим соединением перезапускает бэкап с начала; после стольких
+# перезапусков оставшаяся часть копируется за один шаг
+BACKUP_MAX_RESTARTS = 3
+# Хранилище контактов: sqlite (по умолчанию) или memory — в памяти со снимками на диск
+STORAGE_BACKEND = os.environ.get('PHONEBOOK_STORAGE', 'sqlite')
+SNAPSHOT_PATH = os.environ.get('PHONEBOOK_SNAPSHOT_PATH', 'phonebook.snapshot.json')
+SNAPSHOT_INTERVAL = float(os.environ.get('PHONEBOOK_SNAPSHOT_INTERVAL', 5))
+# Ограничение частоты запросов на клиента (токенов в секунду и запас) для записи и поиска,
+# и число одновременных обращений к хранилищу с коротким ожиданием свободного места.
+# Значение 0 у частоты или числа обращений означает «без ограничения»; отрицательные — ошибка запуска
+RATE_LIMITING_ENABLED = os.environ.get('PHONEBOOK_RATE_LIMITING', '1') == '1'
+WRITE_RATE = float(os.environ.get('PHONEBOOK_WRITE_RATE', 20))
+WRITE_BURST = float(os.environ.get('PHONEBOOK_WRITE_BURST', 100))
+SEARCH_RATE = float(os.environ.get('PHONEBOOK_SEARCH_RATE', 50))
+SEARCH_BURST = float(os.environ.get('PHONEBOOK_SEARCH_BURST', 200))
+MAX_CONCURRENT_DB = int(os.environ.get('PHONEBOOK_MAX_CONCURRENT', 16))
+CONCURRENCY_WAIT = float(os.environ.get('PHONEBOOK_CONCURRENCY_WAIT', 0.05))
+# Сжатие ответов API больше порога (в байтах) и кэширование статики
+COMPRESS_MIN_SIZE = int(os.environ.get('PHONEBOOK_COMPRESS_MIN_SIZE', 1024))
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/plain', 'text/html', 'text/css',
+                          'application/javascript', 'text/javascript'}
+FINGERPRINTED_ASSETS = ['styles.css', 'script.js']
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Порог журнала медленных запросов в миллисекундах
+slow_query_log.threshold_ms = float(os.environ.get('PHONEBOOK_SLOW_QUERY_MS', 100))
+# Если задан токен, админские эндпоинты требуют заголовок X-Admin-Token
+ADMIN_TOKEN = os.environ.get('PHONEBOOK_ADMIN_TOKEN')
+# Профилирование запросов: включается явно, затем по заголовку X-Profile: 1
+# или для каждого N-го запроса; хранятся последние PROFILE_KEEP профилей
+PROFILING_ENABLED = os.environ.get('PHONEBOOK_PROFILING') == '1'
+PROFILE_SAMPLE_EVERY = int(os.environ.get('PHONEBOOK_PROFILE_SAMPLE', 0))
+PROFILE_KEEP = int(os.environ.get('PHONEBOOK_PROFILE_KEEP', 20))
+
 # Настройка Swagger
 swagger_config = {
     "headers": [],
@@ -41,38 +91,298 @@ swagger_template = {
 
 swagger = Swagger(app, config=swagger_config, template=swagger_template)
 
+# Включение профилирования запросов (без него обёртка не устанавливается)
+def enable_profiling(sample_every=PROFILE_SAMPLE_EVERY, keep=PROFILE_KEEP):
+    profile_store.resize(keep)
+    app.wsgi_app = ProfilingMiddleware(app.wsgi_app, profile_store, sample_every=sample_every,
+                                       token=ADMIN_TOKEN, skip_prefix='/api/admin/profiles')
+
+if PROFILING_ENABLED:
+    enable_profiling()
+
+# Подключение к базе с замером времени каждого запроса
+def connect_db():
+    return sqlite3.connect(DB_PATH, factory=TimedConnection)
+
+# Создание хранилища по настройке STORAGE_BACKEND
+def create_repository(backend=STORAGE_BACKEND):
+    if backend == 'memory':
+        return MemoryRepository(SNAPSHOT_PATH, SNAPSHOT_INTERVAL)
+    if backend == 'sqlite':
+        return SQLiteRepository(connect_db)
+    raise ValueError(f'Неизвестное хранилище: {backend}')
+
+repository = create_repository()
+
 # Инициализация базы данных
 def init_db():
-    conn = sqlite3.connect('phonebook.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS contacts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            phone TEXT NOT NULL,
-            is_favorite BOOLEAN DEFAULT 0,
-            order_index INTEGER DEFAULT 0
-        )
-    ''')
-    try:
-        cursor.execute('ALTER TABLE contacts ADD COLUMN order_index INTEGER DEFAULT 0')
-    except sqlite3.OperationalError:
-        pass  
-    
-    cursor.execute('UPDATE contacts SET order_index = id WHERE order_index = 0 OR order_index IS NULL')
-    
-    conn.commit()
-    conn.close()
+    repository.init()
+    invalidate_contacts_index()
 
 # Валидация телефона
 def validate_phone(phone):
     pattern = r'^\+7 \(\d{3}\) \d{3}-\d{2}-\d{2}$'
     return re.match(pattern, phone) is not None
 
+# Проверка доступа к админским эндпоинтам
+def admin_required(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if ADMIN_TOKEN and request.headers.get('X-Admin-Token') != ADMIN_TOKEN:
+            return jsonify({'error': 'Доступ запрещён'}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+# Онлайн-бэкап базы через sqlite3 backup API.
+# Копирование идёт порциями по pages страниц с паузой sleep между шагами,
+# поэтому писатели не блокируются на всё время копирования.
+# SQLite начинает копирование заново после каждой записи в исходную базу (remaining растёт);
+# при постоянной записи это может не закончиться никогда, поэтому после max_restarts
+# перезапусков остаток копируется одним шагом.
+class _BackupRestartLimit(Exception):
+    pass
+
+def backup_db(dest_path, pages=None, sleep=None, progress=None, max_restarts=None):
+    pages = BACKUP_PAGES_PER_STEP if pages is None else pages
+    sleep = BACKUP_STEP_SLEEP if sleep is None else sleep
+    max_restarts = BACKUP_MAX_RESTARTS if max_restarts is None else max_restarts
+    steps = 0
+    total_pages = 0
+    restarts = 0
+    last_remaining = None
+    single_step = False
+
+    def on_progress(status, remaining, total):
+        nonlocal steps, total_pages, restarts, last_remaining
+        steps += 1
+        total_pages = total
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+        last_remaining = remaining
+        if progress is not None:
+            progress(total - remaining, total)
+        if not single_step and remaining and restarts > max_restarts:
+            raise _BackupRestartLimit()
+        if sleep and remaining:
+            time.sleep(sleep)
+
+    # sqlite3.connect создал бы пустую базу и вернул пустую копию
+    if not os.path.exists(DB_PATH):
+        raise FileNotFoundError(f'База данных не найдена: {DB_PATH}')
+    dest_dir = os.path.dirname(dest_path)
+    if dest_dir and not os.path.exists(dest_dir):
+        os.makedirs(dest_dir)
+    src = connect_db()
+    dst = sqlite3.connect(dest_path)
+    started = time.perf_counter()
+    try:
+        page_size = src.execute('PRAGMA page_size').fetchone()[0]
+        try:
+            src.backup(dst, pages=pages, progress=on_progress)
+        except _BackupRestartLimit:
+            single_step = True
+            src.backup(dst, pages=-1, progress=on_progress)
+    finally:
+        dst.close()
+        src.close()
+    elapsed = time.perf_counter() - started
+    size = os.path.getsize(dest_path)
+    return {
+        'path': dest_path,
+        'pages': total_pages,
+        'page_size': page_size,
+        'steps': steps,
+        'restarts': restarts,
+        'single_step_fallback': single_step,
+        'bytes': size,
+        'seconds': round(elapsed, 4),
+        'bytes_per_second': round(size / elapsed) if elapsed > 0 else None,
+    }
+
+# Алфавитный указатель для навигации «перейти к букве».
+# Кэшируется до первой записи, поэтому отвечает за O(1) независимо от размера таблицы.
+# Строится без блокировки: запись увеличивает поколение, и указатель, построенный
+# по устаревшим данным, в кэш не попадает.
+CYRILLIC_ALPHABET = 'АБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ'
+LATIN_ALPHABET = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+OTHER_SECTION = '#'
+_contacts_index = None
+_contacts_index_generation = 0
+_contacts_index_lock = threading.Lock()
+
+def contact_initial(name):
+    letter = name.strip()[:1].upper()
+    if letter and (letter in CYRILLIC_ALPHABET or letter in LATIN_ALPHABET):
+        return letter
+    return OTHER_SECTION
+
+def _section_sort_key(letter):
+    if letter in CYRILLIC_ALPHABET:
+        return (0, CYRILLIC_ALPHABET.index(letter))
+    if letter in LATIN_ALPHABET:
+        return (1, LATIN_ALPHABET.index(letter))
+    return (2, 0)
+
+def build_contacts_index(contacts):
+    sections = {}
+    total = 0
+    favorites = 0
+    for offset, contact in enumerate(contacts):
+        total += 1
+        if contact['is_favorite']:
+            favorites += 1
+        letter = contact_initial(contact['name'])
+        section = sections.get(letter)
+        if section is None:
+            sections[letter] = {'letter': letter, 'count': 1, 'offset': offset, 'id': contact['id']}
+        else:
+            section['count'] += 1
+    return {
+        'total': total,
+        'favorites': favorites,
+        'sections': sorted(sections.values(), key=lambda s: _section_sort_key(s['letter'])),
+    }
+
+def get_contacts_index(repo):
+    global _contacts_index
+    with _contacts_index_lock:
+        if _contacts_index is not None:
+            return _contacts_index
+        generation = _contacts_index_generation
+    index = build_contacts_index(repo.list_contacts())
+    with _contacts_index_lock:
+        if generation == _contacts_index_generation:
+            _contacts_index = index
+    return index
+
+def invalidate_contacts_index():
+    global _contacts_index, _contacts_index_generation
+    with _contacts_index_lock:
+        _contacts_index = None
+        _contacts_index_generation += 1
+
+# Отпечатки статических файлов: URL вида /static/script.js?v=<хэш> кэшируются навсегда
+def build_asset_hashes():
+    hashes = {}
+    for filename in FINGERPRINTED_ASSETS:
+        path = os.path.join(app.static_folder, filename)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                hashes[filename] = hashlib.sha256(f.read()).hexdigest()[:12]
+    return hashes
+
+# index.html с URL статики, содержащими хэш, заранее сжатый во всех поддерживаемых кодировках
+def build_index_page(asset_hashes):
+    path = os.path.join(app.static_folder, 'index.html')
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        html = f.read()
+    for filename, digest in asset_hashes.items():
+        html = html.replace(f'/static/{filename}"', f'/static/{filename}?v={digest}"')
+    body = html.encode('utf-8')
+    etag = hashlib.sha256(body).hexdigest()[:16]
+    # Разные кодировки — разные представления, поэтому и сильные ETag у них разные
+    page = {'identity': (body, etag)}
+    for encoding in supported_encodings():
+        page[encoding] = (compress(body, encoding), f'{etag}-{encoding}')
+    return page
+
+asset_hashes = build_asset_hashes()
+index_page = build_index_page(asset_hashes)
+
+rate_limiter = RateLimiter({
+    'write': (WRITE_RATE, WRITE_BURST),
+    'search': (SEARCH_RATE, SEARCH_BURST),
+})
+db_limiter = ConcurrencyLimiter(MAX_CONCURRENT_DB, CONCURRENCY_WAIT)
+
+# Класс маршрута для ограничений: write, search, read или None (не ограничивается)
+def classify_request():
+    if not request.path.startswith('/api/contacts') or request.method == 'OPTIONS':
+        return None
+    if request.method in ('POST', 'PUT', 'DELETE'):
+        return 'write'
+    if request.args.get('search', '').strip():
+        return 'search'
+    return 'read'
+
+# Быстрый отказ вместо неограниченной очереди: 429 при превышении частоты, 503 при перегрузке
+@app.before_request
+def limit_request():
+    if not RATE_LIMITING_ENABLED:
+        return None
+    route_class = classify_request()
+    if route_class is None:
+        return None
+    wait = rate_limiter.check(request.remote_addr, route_class)
+    if wait:
+        response = jsonify({'error': 'Слишком много запросов, повторите позже'})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(retry_after_seconds(wait))
+        return response
+    if not db_limiter.acquire():
+        response = jsonify({'error': 'Сервер перегружен, повторите позже'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+        return response
+    g.db_slot = True
+    return None
+
+@app.teardown_request
+def release_db_slot(exc):
+    if g.pop('db_slot', False):
+        db_limiter.release()
+
 # Главная страница
 @app.route('/')
 def index():
-    return send_from_directory(app.static_folder, 'index.html')
+    if index_page is None:
+        return send_from_directory(app.static_folder, 'index.html')
+    encoding = choose_encoding(request.accept_encodings)
+    body, etag = index_page[encoding or 'identity']
+    response = Response(body, mimetype='text/html')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
+# Долгое кэширование статики, запрошенной по URL с актуальным хэшем
+@app.after_request
+def set_static_cache_headers(response):
+    if request.path.startswith('/static/') and response.status_code == 200:
+        filename = request.path[len('/static/'):]
+        version = request.args.get('v')
+        if version and asset_hashes.get(filename) == version:
+            response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+# Сжатие ответов API: gzip или brotli по Accept-Encoding, потоковые ответы сжимаются на лету
+@app.after_request
+def compress_api_response(response):
+    if not request.path.startswith('/api/') or request.method == 'HEAD':
+        return response
+    if response.status_code < 200 or response.status_code in (204, 304):
+        return response
+    if 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.accept_encodings)
+    if not encoding:
+        return response
+    if response.is_streamed:
+        response.response = compress_stream(response.iter_encoded(), encoding)
+        response.direct_passthrough = False
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+        response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
 
 # API: Получение контактов
 @app.route('/api/contacts', methods=['GET'])
@@ -113,32 +423,58 @@ def get_contacts():
                 description: Порядок сортировки
     """
     search = request.args.get('search', '').strip()
-    conn = sqlite3.connect('phonebook.db')
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT * FROM contacts
-        ORDER BY is_favorite DESC, order_index ASC, name ASC
-    ''')
-    
-    rows = cursor.fetchall()
-    contacts = [dict(zip(row.keys(), row)) for row in rows]
-    
     if search:
-        search_lower = search.lower()
-        search_digits = ''.join(filter(str.isdigit, search))
-        
-        def matches_contact(contact):
-            name_match = search_lower in contact['name'].lower()
-            phone_digits = ''.join(filter(str.isdigit, contact['phone']))
-            phone_match = search_digits in phone_digits if search_digits else False
-            return name_match or phone_match
-        
-        contacts = [c for c in contacts if matches_contact(c)]
-    conn.close()
+        contacts = repository.search(search)
+    else:
+        contacts = repository.list_contacts()
     return jsonify(contacts)
 
+# API: Алфавитный указатель контактов
+@app.route('/api/contacts/index', methods=['GET'])
+def get_contacts_alphabet_index():
+    """
+    Алфавитный указатель для перехода к букве
+    ---
+    tags:
+      - Контакты
+    responses:
+      200:
+        description: >
+          Количество контактов на каждую начальную букву и позиция первого из них.
+          Список отсортирован не по имени (сначала избранные, затем пользовательский порядок),
+          поэтому контакты на одну букву не обязательно идут подряд
+        schema:
+          type: object
+          properties:
+            total:
+              type: integer
+              description: Всего контактов
+            favorites:
+              type: integer
+              description: Количество избранных (они идут первыми)
+            sections:
+              type: array
+              items:
+                type: object
+                properties:
+                  letter:
+                    type: string
+                    description: Начальная буква (кириллица, латиница или "#")
+                  count:
+                    type: integer
+                    description: Количество контактов на эту букву
+                  offset:
+                    type: integer
+                    description: Позиция первого вхождения буквы в списке GET /api/contacts
+                  id:
+                    type: integer
+                    description: ID первого такого контакта
+    """
+    try:
+        return jsonify(get_contacts_index(repository))
+    except sqlite3.Error as e:
+        return jsonify({'error': f'Ошибка базы данных: {str(e)}'}), 500
+
 # API: Добавление контакта
 @app.route('/api/contacts', methods=['POST'])
 def add_contact():
@@ -210,39 +546,15 @@ def add_contact():
         return jsonify({'error': 'Имя не может быть пустым'}), 400
     if not validate_phone(phone):
         return jsonify({'error': 'Неверный формат телефона. Используйте: +7 (999) 999-99-99'}), 400
-    conn = sqlite3.connect('phonebook.db')
-    conn.row_factory = sqlite3.Row  
-    cursor = conn.cursor()
     try:
-        cursor.execute('SELECT COALESCE(MAX(order_index), 0) FROM contacts')
-        max_order = cursor.fetchone()[0]
-        new_order = max_order + 1
-        
-        cursor.execute('''
-            INSERT INTO contacts (name, phone, is_favorite, order_index)
-            VALUES (?, ?, ?, ?)
-        ''', (name, phone, is_favorite, new_order))
-        conn.commit()
-        new_id = cursor.lastrowid
-        if new_id is not None and new_id > 0:
-            cursor.execute('SELECT * FROM contacts WHERE id = ?', (new_id,))
-            row = cursor.fetchone()
-            if row is not None:
-                new_contact = dict(zip(row.keys(), row))  
-                conn.close() 
-                return jsonify(new_contact), 201
-            else:
-                conn.close()
-                return jsonify({'error': 'Не удалось получить данные нового контакта после вставки'}), 500
-        else:
-            conn.close()
-            return jsonify({'error': 'Не удалось получить ID нового контакта'}), 500
+        new_contact = repository.add(name, phone, is_favorite)
+        invalidate_contacts_index()
+        if new_contact is None:
+            return jsonify({'error': 'Не удалось получить данные нового контакта после вставки'}), 500
+        return jsonify(new_contact), 201
     except sqlite3.Error as e:
-        conn.rollback() 
-        conn.close()
         return jsonify({'error': f'Ошибка базы данных: {str(e)}'}), 500
     except Exception as e:
-        conn.close()
         return jsonify({'error': f'Внутренняя ошибка сервера: {str(e)}'}), 500
 
 # API: Удаление контакта
@@ -283,24 +595,14 @@ def delete_contact(contact_id):
             error:
               type: string
     """
-    conn = sqlite3.connect('phonebook.db')
-    cursor = conn.cursor()
     try:
-        cursor.execute('SELECT 1 FROM contacts WHERE id = ?', (contact_id,))
-        exists = cursor.fetchone()
-        if not exists:
-            conn.close()
+        if not repository.delete(contact_id):
             return jsonify({'error': 'Контакт не найден'}), 404
-        cursor.execute('DELETE FROM contacts WHERE id = ?', (contact_id,))
-        conn.commit()
-        conn.close()
+        invalidate_contacts_index()
         return jsonify({'message': 'Контакт удалён'}), 200
     except sqlite3.Error as e:
-        conn.rollback()
-        conn.close()
         return jsonify({'error': f'Ошибка базы данных: {str(e)}'}), 500
     except Exception as e:
-        conn.close()
         return jsonify({'error': f'Внутренняя ошибка сервера: {str(e)}'}), 500
 
 # API: Изменение статуса избранного
@@ -348,33 +650,15 @@ def toggle_favorite(contact_id):
             error:
               type: string
     """
-    conn = sqlite3.connect('phonebook.db')
-    conn.row_factory = sqlite3.Row  
-    cursor = conn.cursor()
     try:
-        cursor.execute('SELECT is_favorite FROM contacts WHERE id = ?', (contact_id,))
-        row = cursor.fetchone()
-        if row is None:
-            conn.close()
+        updated_contact = repository.toggle_favorite(contact_id)
+        if updated_contact is None:
             return jsonify({'error': 'Контакт не найден'}), 404
-        new_value = 0 if row[0] else 1
-        cursor.execute('UPDATE contacts SET is_favorite = ? WHERE id = ?', (new_value, contact_id))
-        conn.commit()
-        cursor.execute('SELECT * FROM contacts WHERE id = ?', (contact_id,))
-        updated_row = cursor.fetchone()
-        if updated_row is not None:
-            updated_contact = dict(zip(updated_row.keys(), updated_row))  
-            conn.close() 
-            return jsonify(updated_contact), 200
-        else:
-            conn.close()
-            return jsonify({'error': 'Не удалось получить данные обновленного контакта'}), 500
+        invalidate_contacts_index()
+        return jsonify(updated_contact), 200
     except sqlite3.Error as e:
-        conn.rollback()
-        conn.close()
         return jsonify({'error': f'Ошибка базы данных: {str(e)}'}), 500
     except Exception as e:
-        conn.close()
         return jsonify({'error': f'Внутренняя ошибка сервера: {str(e)}'}), 500
 
 # API: Обновление порядка контактов
@@ -432,25 +716,367 @@ def update_contacts_order():
     if not isinstance(contact_ids, list):
         return jsonify({'error': 'contact_ids должен быть массивом'}), 400
     
-    conn = sqlite3.connect('phonebook.db')
-    cursor = conn.cursor()
     try:
-        for index, contact_id in enumerate(contact_ids):
-            cursor.execute('UPDATE contacts SET order_index = ? WHERE id = ?', (index, contact_id))
-        
-        conn.commit()
-        conn.close()
+        repository.reorder(contact_ids)
+        invalidate_contacts_index()
         return jsonify({'message': 'Порядок контактов обновлён'}), 200
     except sqlite3.Error as e:
-        conn.rollback()
-        conn.close()
         return jsonify({'error': f'Ошибка базы данных: {str(e)}'}), 500
     except Exception as e:
-        conn.close()
         return jsonify({'error': f'Внутренняя ошибка сервера: {str(e)}'}), 500
 
-if __name__ == '__main__':
+# API: Онлайн-бэкап базы данных
+@app.route('/api/admin/backup', methods=['POST'])
+@admin_required
+def create_backup():
+    """
+    Создание резервной копии базы данных без остановки сервера.
+    Ответ приходит после завершения копирования; ход копирования
+    выводится только в CLI (python server.py backup).
+    ---
+    tags:
+      - Администрирование
+    parameters:
+      - in: body
+        name: body
+        required: false
+        schema:
+          type: object
+          properties:
+            filename:
+              type: string
+              description: Имя файла копии в каталоге бэкапов
+              example: "phonebook-backup.db"
+            pages:
+              type: integer
+              description: Количество страниц, копируемых за один шаг
+              example: 1024
+            sleep:
+              type: number
+              description: Пауза между шагами в секундах
+              example: 0.005
+            max_restarts:
+              type: integer
+              description: Сколько перезапусков из-за записи допустить до копирования остатка одним шагом
+              example: 3
+    responses:
+      201:
+        description: Резервная копия создана
+        schema:
+          type: object
+          properties:
+            path:
+              type: string
+            pages:
+              type: integer
+            page_size:
+              type: integer
+            steps:
+              type: integer
+            restarts:
+              type: integer
+              description: Сколько раз копирование начиналось заново из-за записи в базу
+            single_step_fallback:
+              type: boolean
+              description: Остаток скопирован одним шагом после превышения max_restarts
+            bytes:
+              type: integer
+            seconds:
+              type: number
+            bytes_per_second:
+              type: integer
+      400:
+        description: Ошибка валидации данных
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+      500:
+        description: Внутренняя ошибка сервера
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+    """
+    if not isinstance(repository, SQLiteRepository):
+        return jsonify({'error': 'Онлайн-бэкап доступен только для хранилища SQLite'}), 400
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Тело запроса должно быть JSON-объектом'}), 400
+    filename = data.get('filename') or time.strftime('phonebook-%Y%m%d-%H%M%S.db')
+    if not isinstance(filename, str) or os.path.basename(filename) != filename or filename.startswith('.'):
+        return jsonify({'error': 'Некорректное имя файла'}), 400
+    pages = data.get('pages', BACKUP_PAGES_PER_STEP)
+    sleep = data.get('sleep', BACKUP_STEP_SLEEP)
+    if not isinstance(pages, int) or isinstance(pages, bool) or pages <= 0:
+        return jsonify({'error': 'pages должен быть положительным целым числом'}), 400
+    if not isinstance(sleep, (int, float)) or isinstance(sleep, bool) or sleep < 0:
+        return jsonify({'error': 'sleep должен быть неотрицательным числом'}), 400
+    max_restarts = data.get('max_restarts', BACKUP_MAX_RESTARTS)
+    if not isinstance(max_restarts, int) or isinstance(max_restarts, bool) or max_restarts < 0:
+        return jsonify({'error': 'max_restarts должен быть неотрицательным целым числом'}), 400
+    try:
+        result = backup_db(os.path.join(BACKUP_DIR, filename), pages=pages, sleep=sleep,
+                           max_restarts=max_restarts)
+        return jsonify(result), 201
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 500
+    except sqlite3.Error as e:
+        return jsonify({'error': f'Ошибка базы данных: {str(e)}'}), 500
+    except Exception as e:
+        return jsonify({'error': f'Внутренняя ошибка сервера: {str(e)}'}), 500
+
+# API: Статистика медленных запросов
+@app.route('/api/admin/slow-queries', methods=['GET'])
+@admin_required
+def get_slow_queries():
+    """
+    Статистика медленных SQL-запросов
+    ---
+    tags:
+      - Администрирование
+    responses:
+      200:
+        description: Агрегированная статистика запросов дольше порога
+        schema:
+          type: object
+          properties:
+            threshold_ms:
+              type: number
+            total_statements:
+              type: integer
+            slow_statements:
+              type: array
+              items:
+                type: object
+                properties:
+                  sql:
+                    type: string
+                  count:
+                    type: integer
+                  total_ms:
+                    type: number
+                  avg_ms:
+                    type: number
+                  max_ms:
+                    type: number
+                  last_params:
+                    type: array
+                    items: {}
+                  plan:
+                    type: array
+                    items:
+                      type: string
+    """
+    return jsonify(slow_query_log.snapshot())
+
+# API: Сброс статистики медленных запросов
+@app.route('/api/admin/slow-queries', methods=['DELETE'])
+@admin_required
+def reset_slow_queries():
+    """
+    Сброс статистики медленных SQL-запросов
+    ---
+    tags:
+      - Администрирование
+    responses:
+      200:
+        description: Статистика сброшена
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+              example: "Статистика сброшена"
+    """
+    slow_query_log.reset()
+    return jsonify({'message': 'Статистика сброшена'}), 200
+
+# API: Список сохранённых профилей запросов
+@app.route('/api/admin/profiles', methods=['GET'])
+@admin_required
+def list_profiles():
+    """
+    Список последних профилей запросов
+    ---
+    tags:
+      - Администрирование
+    responses:
+      200:
+        description: Профили в порядке от новых к старым
+        schema:
+          type: array
+          items:
+            type: object
+            properties:
+              id:
+                type: integer
+              method:
+                type: string
+              path:
+                type: string
+              status:
+                type: integer
+              seconds:
+                type: number
+              timestamp:
+                type: number
+    """
+    return jsonify(profile_store.list())
+
+# API: Получение профиля запроса
+@app.route('/api/admin/profiles/<int:profile_id>', methods=['GET'])
+@admin_required
+def get_profile(profile_id):
+    """
+    Получение профиля запроса в формате pstats, текстовом или свёрнутых стеков
+    ---
+    tags:
+      - Администрирование
+    parameters:
+      - name: profile_id
+        in: path
+        type: integer
+        required: true
+        description: ID профиля
+      - name: format
+        in: query
+        type: string
+        required: false
+        enum: [text, pstats, collapsed]
+        default: text
+        description: text — отчёт pstats, pstats — бинарный дамп, collapsed — стеки для flamegraph
+    responses:
+      200:
+        description: Профиль в запрошенном формате
+      400:
+        description: Неизвестный формат
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+      404:
+        description: Профиль не найден
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+    """
+    entry = profile_store.get(profile_id)
+    if entry is None:
+        return jsonify({'error': 'Профиль не найден'}), 404
+    fmt = request.args.get('format', 'text')
+    if fmt == 'text':
+        return to_text(entry['stats']), 200, {'Content-Type': 'text/plain; charset=utf-8'}
+    if fmt == 'collapsed':
+        return to_collapsed(entry['stats']), 200, {'Content-Type': 'text/plain; charset=utf-8'}
+    if fmt == 'pstats':
+        return to_pstats(entry['stats']), 200, {
+            'Content-Type': 'application/octet-stream',
+            'Content-Disposition': f'attachment; filename=profile-{profile_id}.pstats',
+        }
+    return jsonify({'error': 'Неизвестный формат: используйте text, pstats или collapsed'}), 400
+
+# API: Счётчики ограничения запросов
+@app.route('/api/admin/limits', methods=['GET'])
+@admin_required
+def get_limits():
+    """
+    Настройки и счётчики ограничения частоты и параллельности запросов
+    ---
+    tags:
+      - Администрирование
+    responses:
+      200:
+        description: Текущие лимиты и сколько раз они срабатывали
+        schema:
+          type: object
+          properties:
+            enabled:
+              type: boolean
+            rate:
+              type: object
+              properties:
+                limits:
+                  type: object
+                allowed:
+                  type: object
+                rejected:
+                  type: object
+                clients:
+                  type: integer
+            concurrency:
+              type: object
+              properties:
+                max_concurrent:
+                  type: integer
+                wait:
+                  type: number
+                in_flight:
+                  type: integer
+                admitted:
+                  type: integer
+                shed:
+                  type: integer
+    """
+    return jsonify({
+        'enabled': RATE_LIMITING_ENABLED,
+        'rate': rate_limiter.stats(),
+        'concurrency': db_limiter.stats(),
+    })
+
+def run_server(args):
     init_db()
+    if isinstance(repository, MemoryRepository):
+        repository.start_background_snapshots()
+        atexit.register(repository.close)
     print(" Сервер запущен на http://localhost:5000")
     print(" Swagger документация: http://localhost:5000/api-docs")
-    app.run(host='127.0.0.1', port=5000, debug=True)
\ No newline at end of file
+    app.run(host='127.0.0.1', port=5000, debug=True)
+
+def run_backup(args):
+    def report(done, total):
+        percent = done * 100 // total if total else 100
+        print(f" Бэкап: {done}/{total} страниц ({percent}%)")
+
+    if not isinstance(repository, SQLiteRepository):
+        print(' Онлайн-бэкап доступен только для хранилища SQLite', file=sys.stderr)
+        sys.exit(1)
+    try:
+        result = backup_db(args.dest, pages=args.pages, sleep=args.sleep, progress=report,
+                           max_restarts=args.max_restarts)
+    except (FileNotFoundError, sqlite3.Error) as e:
+        print(f' Ошибка бэкапа: {e}', file=sys.stderr)
+        sys.exit(1)
+    mb_per_second = (result['bytes_per_second'] or 0) / (1024 * 1024)
+    if result['restarts']:
+        print(f" Перезапусков из-за записи: {result['restarts']}"
+              + (", остаток скопирован одним шагом" if result['single_step_fallback'] else ""))
+    print(f" Готово: {result['path']}, {result['bytes']} байт за {result['seconds']} с ({mb_per_second:.2f} МБ/с)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='PhoneBook сервер')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('run', help='Запуск сервера (по умолчанию)')
+    backup_parser = subparsers.add_parser('backup', help='Онлайн-бэкап базы данных')
+    backup_parser.add_argument('dest', help='Путь к файлу резервной копии')
+    backup_parser.add_argument('--pages', type=int, default=BACKUP_PAGES_PER_STEP,
+                               help='Страниц за один шаг копирования')
+    backup_parser.add_argument('--sleep', type=float, default=BACKUP_STEP_SLEEP,
+                               help='Пауза между шагами в секундах')
+    backup_parser.add_argument('--max-restarts', type=int, default=BACKUP_MAX_RESTARTS,
+                               help='Перезапусков из-за записи до копирования остатка одним шагом')
+    args = parser.parse_args(argv)
+    if args.command == 'backup':
+        run_backup(args)
+    else:
+        run_server(args)
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,200 @@
+import sqlite3
+import threading
+import time
+import logging
+import weakref
+
+logger = logging.getLogger('phonebook.slow_query')
+
+
+# Журнал медленных запросов: агрегирует статистику по тексту SQL
+# и один раз на каждый текст сохраняет вывод EXPLAIN QUERY PLAN
+class SlowQueryLog:
+    def __init__(self, threshold_ms=100.0):
+        self.threshold_ms = threshold_ms
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._plans = {}
+        self.total_statements = 0
+
+    def record(self, connection, sql, params, elapsed_ms):
+        with self._lock:
+            self.total_statements += 1
+        if elapsed_ms < self.threshold_ms:
+            return
+        plan = self._plan_for(connection, sql, params)
+        with self._lock:
+            entry = self._stats.get(sql)
+            if entry is None:
+                entry = self._stats[sql] = {
+                    'sql': sql,
+                    'count': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'last_params': None,
+                }
+            entry['count'] += 1
+            entry['total_ms'] += elapsed_ms
+            entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+            entry['last_params'] = _format_params(params)
+        logger.warning('Медленный запрос (%.1f мс): %s; параметры: %r; план: %s',
+                       elapsed_ms, ' '.join(sql.split()), params, '; '.join(plan) or '-')
+
+    def _plan_for(self, connection, sql, params):
+        with self._lock:
+            if sql in self._plans:
+                return self._plans[sql]
+        try:
+            # Базовый курсор, чтобы EXPLAIN не попадал в собственную статистику
+            cursor = sqlite3.Cursor(connection)
+            rows = cursor.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+            plan = [row[-1] for row in rows]
+            cursor.close()
+        except sqlite3.ProgrammingError as e:
+            # Соединение уже закрыто: план возьмём при следующем медленном выполнении
+            return [f'EXPLAIN недоступен: {e}']
+        except sqlite3.Error as e:
+            plan = [f'EXPLAIN недоступен: {e}']
+        with self._lock:
+            self._plans[sql] = plan
+        return plan
+
+    def snapshot(self):
+        with self._lock:
+            statements = []
+            for sql, entry in self._stats.items():
+                item = dict(entry)
+                item['total_ms'] = round(item['total_ms'], 3)
+                item['max_ms'] = round(item['max_ms'], 3)
+                item['avg_ms'] = round(entry['total_ms'] / entry['count'], 3)
+                item['plan'] = self._plans.get(sql, [])
+                statements.append(item)
+            total = self.total_statements
+        statements.sort(key=lambda item: item['total_ms'], reverse=True)
+        return {
+            'threshold_ms': self.threshold_ms,
+            'total_statements': total,
+            'slow_statements': statements,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._plans.clear()
+            self.total_statements = 0
+
+
+def _format_params(params):
+    if isinstance(params, dict):
+        return dict(params)
+    return list(params)
+
+
+slow_query_log = SlowQueryLog()
+
+
+# Курсор, замеряющий время каждого выражения вместе с чтением результата:
+# для SELECT основная работа идёт в fetch*, поэтому время выборки строк
+# прибавляется к выражению, а в журнал оно попадает, когда результат
+# прочитан до конца, курсор закрыт или выполняется следующее выражение.
+class TimedCursor(sqlite3.Cursor):
+    _pending = None
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        started = time.perf_counter()
+        try:
+            result = super().execute(sql, parameters)
+        except BaseException:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            slow_query_log.record(self.connection, sql, parameters, elapsed_ms)
+            raise
+        self._pending = [sql, parameters, (time.perf_counter() - started) * 1000]
+        if self.description is None:
+            self._finish()
+        return result
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        seq_of_parameters = list(seq_of_parameters)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            params = seq_of_parameters[0] if seq_of_parameters else ()
+            slow_query_log.record(self.connection, sql, params, elapsed_ms)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._add(started, exhausted=row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        if size is None:
+            size = self.arraysize
+        started = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._add(started, exhausted=len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._add(started, exhausted=True)
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._add(started, exhausted=True)
+            raise
+        self._add(started, exhausted=False)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+    def _add(self, started, exhausted):
+        if self._pending is not None:
+            self._pending[2] += (time.perf_counter() - started) * 1000
+            if exhausted:
+                self._finish()
+
+    def _finish(self):
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            slow_query_log.record(self.connection, *pending)
+
+
+# Соединение, по умолчанию создающее TimedCursor.
+# Перед закрытием дописывает в журнал выражения, результат которых
+# прочитан не до конца, пока для них ещё можно получить план.
+class TimedConnection(sqlite3.Connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cursors = weakref.WeakSet()
+
+    def cursor(self, factory=TimedCursor):
+        cursor = super().cursor(factory)
+        if isinstance(cursor, TimedCursor):
+            self._cursors.add(cursor)
+        return cursor
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def close(self):
+        for cursor in list(self._cursors):
+            cursor._finish()
+        super().close()
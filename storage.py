@@ -0,0 +1,339 @@
+import abc
+import bisect
+import json
+import os
+import sqlite3
+import threading
+
+
+# Проверка совпадения контакта с поисковым запросом (по имени или цифрам телефона)
+def matches_contact(contact, search_lower, search_digits):
+    name_match = search_lower in contact['name'].lower()
+    phone_digits = ''.join(filter(str.isdigit, contact['phone']))
+    phone_match = search_digits in phone_digits if search_digits else False
+    return name_match or phone_match
+
+
+def _search_terms(search):
+    return search.lower(), ''.join(filter(str.isdigit, search))
+
+
+# Интерфейс хранилища контактов.
+# Контакты возвращаются словарями с полями id, name, phone, is_favorite, order_index
+# в порядке: сначала избранные, затем по order_index и имени.
+class ContactRepository(abc.ABC):
+    @abc.abstractmethod
+    def init(self):
+        pass
+
+    @abc.abstractmethod
+    def list_contacts(self):
+        pass
+
+    def search(self, search):
+        search_lower, search_digits = _search_terms(search)
+        return [c for c in self.list_contacts() if matches_contact(c, search_lower, search_digits)]
+
+    @abc.abstractmethod
+    def add(self, name, phone, is_favorite=False):
+        pass
+
+    @abc.abstractmethod
+    def delete(self, contact_id):
+        pass
+
+    @abc.abstractmethod
+    def toggle_favorite(self, contact_id):
+        pass
+
+    @abc.abstractmethod
+    def reorder(self, contact_ids):
+        pass
+
+    def close(self):
+        pass
+
+
+# Хранилище в SQLite: каждая операция открывает своё соединение через connect()
+class SQLiteRepository(ContactRepository):
+    def __init__(self, connect):
+        self.connect = connect
+
+    def init(self):
+        conn = self.connect()
+        cursor = conn.cursor()
+        # WAL: долгое чтение (например, онлайн-бэкап) не блокирует запись
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS contacts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                phone TEXT NOT NULL,
+                is_favorite BOOLEAN DEFAULT 0,
+                order_index INTEGER DEFAULT 0
+            )
+        ''')
+        try:
+            cursor.execute('ALTER TABLE contacts ADD COLUMN order_index INTEGER DEFAULT 0')
+        except sqlite3.OperationalError:
+            pass
+
+        cursor.execute('UPDATE contacts SET order_index = id WHERE order_index = 0 OR order_index IS NULL')
+
+        conn.commit()
+        conn.close()
+
+    def list_contacts(self):
+        conn = self.connect()
+        conn.row_factory = sqlite3.Row
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT * FROM contacts
+                ORDER BY is_favorite DESC, order_index ASC, name ASC
+            ''')
+            return [dict(zip(row.keys(), row)) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
+    def add(self, name, phone, is_favorite=False):
+        conn = self.connect()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        try:
+            cursor.execute('SELECT COALESCE(MAX(order_index), 0) FROM contacts')
+            new_order = cursor.fetchone()[0] + 1
+            cursor.execute('''
+                INSERT INTO contacts (name, phone, is_favorite, order_index)
+                VALUES (?, ?, ?, ?)
+            ''', (name, phone, is_favorite, new_order))
+            conn.commit()
+            new_id = cursor.lastrowid
+            if new_id is None or new_id <= 0:
+                return None
+            cursor.execute('SELECT * FROM contacts WHERE id = ?', (new_id,))
+            row = cursor.fetchone()
+            return dict(zip(row.keys(), row)) if row is not None else None
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def delete(self, contact_id):
+        conn = self.connect()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('SELECT 1 FROM contacts WHERE id = ?', (contact_id,))
+            if not cursor.fetchone():
+                return False
+            cursor.execute('DELETE FROM contacts WHERE id = ?', (contact_id,))
+            conn.commit()
+            return True
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def toggle_favorite(self, contact_id):
+        conn = self.connect()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        try:
+            cursor.execute('SELECT is_favorite FROM contacts WHERE id = ?', (contact_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            new_value = 0 if row[0] else 1
+            cursor.execute('UPDATE contacts SET is_favorite = ? WHERE id = ?', (new_value, contact_id))
+            conn.commit()
+            cursor.execute('SELECT * FROM contacts WHERE id = ?', (contact_id,))
+            updated_row = cursor.fetchone()
+            return dict(zip(updated_row.keys(), updated_row)) if updated_row is not None else None
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def reorder(self, contact_ids):
+        conn = self.connect()
+        cursor = conn.cursor()
+        try:
+            cursor.executemany('UPDATE contacts SET order_index = ? WHERE id = ?',
+                               [(index, contact_id) for index, contact_id in enumerate(contact_ids)])
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+
+# Компактная запись контакта для хранилища в памяти
+class ContactRecord:
+    __slots__ = ('id', 'name', 'phone', 'is_favorite', 'order_index', 'name_lower', 'phone_digits')
+
+    def __init__(self, id, name, phone, is_favorite, order_index):
+        self.id = id
+        self.name = name
+        self.phone = phone
+        self.is_favorite = 1 if is_favorite else 0
+        self.order_index = order_index
+        self.name_lower = name.lower()
+        self.phone_digits = ''.join(filter(str.isdigit, phone))
+
+    def sort_key(self):
+        return (-self.is_favorite, self.order_index, self.name, self.id)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'phone': self.phone,
+            'is_favorite': self.is_favorite,
+            'order_index': self.order_index,
+        }
+
+
+# Хранилище в памяти: записи со __slots__, отсортированный индекс порядка
+# и периодическое сохранение снимка в JSON-файл фоновым потоком.
+class MemoryRepository(ContactRepository):
+    def __init__(self, snapshot_path=None, snapshot_interval=5.0):
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self._lock = threading.RLock()
+        self._records = {}
+        self._order = []
+        self._next_id = 1
+        self._max_order = 0
+        self._dirty = False
+        self._version = 0
+        self._snapshot_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def init(self):
+        with self._lock:
+            self._records.clear()
+            self._order = []
+            self._next_id = 1
+            self._max_order = 0
+            if self.snapshot_path and os.path.exists(self.snapshot_path):
+                with open(self.snapshot_path, encoding='utf-8') as f:
+                    data = json.load(f)
+                for item in data['contacts']:
+                    order_index = item.get('order_index') or item['id']
+                    self._records[item['id']] = ContactRecord(
+                        item['id'], item['name'], item['phone'], item['is_favorite'], order_index)
+                self._next_id = max(data.get('next_id', 1), max(self._records, default=0) + 1)
+                self._rebuild_order()
+            self._dirty = False
+
+    def _rebuild_order(self):
+        self._order = sorted((record.sort_key(), record.id) for record in self._records.values())
+        self._max_order = max((record.order_index for record in self._records.values()), default=0)
+
+    def _unlink(self, record):
+        position = bisect.bisect_left(self._order, (record.sort_key(), record.id))
+        del self._order[position]
+
+    def _link(self, record):
+        bisect.insort(self._order, (record.sort_key(), record.id))
+
+    def list_contacts(self):
+        with self._lock:
+            return [self._records[contact_id].to_dict() for _, contact_id in self._order]
+
+    def search(self, search):
+        search_lower, search_digits = _search_terms(search)
+        with self._lock:
+            result = []
+            for _, contact_id in self._order:
+                record = self._records[contact_id]
+                if search_lower in record.name_lower or (search_digits and search_digits in record.phone_digits):
+                    result.append(record.to_dict())
+            return result
+
+    def add(self, name, phone, is_favorite=False):
+        with self._lock:
+            self._max_order += 1
+            record = ContactRecord(self._next_id, name, phone, is_favorite, self._max_order)
+            self._next_id += 1
+            self._records[record.id] = record
+            self._link(record)
+            self._changed()
+            return record.to_dict()
+
+    def delete(self, contact_id):
+        with self._lock:
+            record = self._records.pop(contact_id, None)
+            if record is None:
+                return False
+            self._unlink(record)
+            if record.order_index == self._max_order:
+                self._max_order = max((r.order_index for r in self._records.values()), default=0)
+            self._changed()
+            return True
+
+    def toggle_favorite(self, contact_id):
+        with self._lock:
+            record = self._records.get(contact_id)
+            if record is None:
+                return None
+            self._unlink(record)
+            record.is_favorite = 0 if record.is_favorite else 1
+            self._link(record)
+            self._changed()
+            return record.to_dict()
+
+    def reorder(self, contact_ids):
+        with self._lock:
+            for index, contact_id in enumerate(contact_ids):
+                record = self._records.get(contact_id)
+                if record is not None:
+                    record.order_index = index
+            self._rebuild_order()
+            self._changed()
+
+    def _changed(self):
+        self._dirty = True
+        self._version += 1
+
+    # Атомарная запись снимка: во временный файл, затем os.replace.
+    # Под блокировкой только копируются строки; сериализация и запись идут без неё,
+    # чтобы запросы не ждали записи на диск.
+    def snapshot(self):
+        if not self.snapshot_path:
+            return False
+        with self._snapshot_lock:
+            with self._lock:
+                version = self._version
+                data = {
+                    'next_id': self._next_id,
+                    'contacts': [record.to_dict() for record in self._records.values()],
+                }
+            tmp_path = self.snapshot_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.snapshot_path)
+            with self._lock:
+                if self._version == version:
+                    self._dirty = False
+            return True
+
+    # Фоновый поток, сохраняющий снимок раз в snapshot_interval секунд, если были изменения
+    def start_background_snapshots(self):
+        def loop():
+            while not self._stop.wait(self.snapshot_interval):
+                if self._dirty:
+                    self.snapshot()
+
+        thread = threading.Thread(target=loop, name='phonebook-snapshot', daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        self._stop.set()
+        if self._dirty:
+            self.snapshot()
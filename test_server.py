@@ -4,54 +4,43 @@ import os
 import tempfile
 import json
 from server import app, init_db, validate_phone
+from storage import ContactRepository, MemoryRepository, SQLiteRepository
+from rate_limit import ConcurrencyLimiter, RateLimiter
+from slow_query import TimedConnection
 
 
-@pytest.fixture
-def client(monkeypatch):
-    """Создает тестовый клиент Flask с временной базой данных"""
-    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+@pytest.fixture(params=['sqlite', 'memory'])
+def client(request, monkeypatch):
+    """Создает тестовый клиент Flask с временной базой данных (SQLite или в памяти)"""
+    import server
     app.config['TESTING'] = True
+    server.rate_limiter.reset()
     
-    def test_init_db():
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS contacts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                phone TEXT NOT NULL,
-                is_favorite BOOLEAN DEFAULT 0,
-                order_index INTEGER DEFAULT 0
-            )
-        ''')
-        try:
-            cursor.execute('ALTER TABLE contacts ADD COLUMN order_index INTEGER DEFAULT 0')
-        except sqlite3.OperationalError:
-            pass
-        cursor.execute('UPDATE contacts SET order_index = id WHERE order_index = 0 OR order_index IS NULL')
-        conn.commit()
-        conn.close()
-    
-    original_connect = sqlite3.connect
-    
-    def test_connect(database, *args, **kwargs):
-        if database == 'phonebook.db':
-            return original_connect(db_path, *args, **kwargs)
-        return original_connect(database, *args, **kwargs)
-    
-    import server
-    monkeypatch.setattr(server.sqlite3, 'connect', test_connect)
+    if request.param == 'memory':
+        repository = MemoryRepository()
+        repository.init()
+        monkeypatch.setattr(server, 'repository', repository)
+        server.invalidate_contacts_index()
+        with app.test_client() as client:
+            yield client
+        return
     
-    test_init_db()
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    repository = SQLiteRepository(lambda: sqlite3.connect(db_path, factory=TimedConnection))
+    repository.init()
+    monkeypatch.setattr(server, 'repository', repository)
+    monkeypatch.setattr(server, 'DB_PATH', db_path)
+    server.invalidate_contacts_index()
     
     with app.test_client() as client:
         yield client
     
     os.close(db_fd)
-    try:
-        os.unlink(db_path)
-    except:
-        pass
+    for path in (db_path, db_path + '-wal', db_path + '-shm'):
+        try:
+            os.unlink(path)
+        except:
+            pass
 
 
 @pytest.fixture
@@ -370,6 +359,680 @@ class TestUpdateOrder:
         assert 'error' in data
 
 
+class TestContactsIndex:
+    """Тесты для алфавитного указателя"""
+    
+    def test_index_empty(self, client):
+        """Тест указателя для пустой книги"""
+        response = client.get('/api/contacts/index')
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data == {'total': 0, 'favorites': 0, 'sections': []}
+    
+    def test_index_sections(self, client, sample_contacts):
+        """Тест подсчёта секций и смещений"""
+        client.post('/api/contacts',
+                    data=json.dumps({'name': 'alice', 'phone': '+7 (999) 555-66-77'}),
+                    content_type='application/json')
+        contacts = client.get('/api/contacts').get_json()
+        data = client.get('/api/contacts/index').get_json()
+        assert data['total'] == 5
+        assert data['favorites'] == 2
+        letters = [s['letter'] for s in data['sections']]
+        assert letters == ['А', 'И', 'М', 'П', 'A']
+        for section in data['sections']:
+            first = contacts[section['offset']]
+            assert first['id'] == section['id']
+            assert first['name'][0].upper() == section['letter']
+            assert section['count'] == sum(1 for c in contacts if c['name'][0].upper() == section['letter'])
+    
+    def test_index_invalidated_on_write(self, client, sample_contacts):
+        """Тест обновления указателя после изменений"""
+        client.get('/api/contacts/index')
+        client.delete(f'/api/contacts/{sample_contacts[0]}')
+        data = client.get('/api/contacts/index').get_json()
+        assert data['total'] == 3
+        assert 'И' not in [s['letter'] for s in data['sections']]
+        
+        regular = next(c for c in client.get('/api/contacts').get_json() if not c['is_favorite'])
+        client.put(f'/api/contacts/{regular["id"]}/favorite')
+        data = client.get('/api/contacts/index').get_json()
+        assert data['favorites'] == 2
+    
+    def test_index_offset_is_first_occurrence(self, client):
+        """Тест смещения, когда избранный и обычный контакт на одну букву разделены другими"""
+        for name, favorite in [('Анна', False), ('Борис', False), ('Богдан', True)]:
+            client.post('/api/contacts',
+                        data=json.dumps({'name': name, 'phone': '+7 (999) 000-00-00', 'is_favorite': favorite}),
+                        content_type='application/json')
+        contacts = client.get('/api/contacts').get_json()
+        assert [c['name'] for c in contacts] == ['Богдан', 'Анна', 'Борис']
+        data = client.get('/api/contacts/index').get_json()
+        section = next(s for s in data['sections'] if s['letter'] == 'Б')
+        assert section['count'] == 2
+        assert section['offset'] == 0
+        assert section['id'] == contacts[0]['id']
+    
+    def test_index_not_cached_when_invalidated_during_build(self, client, sample_contacts):
+        """Тест того, что указатель строится без блокировки и устаревший результат не кэшируется"""
+        import server
+        list_contacts = server.repository.list_contacts
+        
+        def list_and_write():
+            assert not server._contacts_index_lock.locked()
+            contacts = list_contacts()
+            server.invalidate_contacts_index()
+            return contacts
+        
+        server.repository.list_contacts = list_and_write
+        try:
+            assert client.get('/api/contacts/index').get_json()['total'] == 4
+            assert server._contacts_index is None
+        finally:
+            del server.repository.list_contacts
+        client.get('/api/contacts/index')
+        assert server._contacts_index is not None
+
+
+@pytest.mark.parametrize('client', ['sqlite'], indirect=True)
+class TestBackup:
+    """Тесты для онлайн-бэкапа базы данных"""
+    
+    def test_backup_success(self, client, sample_contacts, tmp_path, monkeypatch):
+        """Тест создания резервной копии"""
+        import server
+        monkeypatch.setattr(server, 'BACKUP_DIR', str(tmp_path))
+        response = client.post('/api/admin/backup',
+                              data=json.dumps({'filename': 'copy.db', 'pages': 1, 'sleep': 0}),
+                              content_type='application/json')
+        assert response.status_code == 201
+        data = response.get_json()
+        assert data['path'] == os.path.join(str(tmp_path), 'copy.db')
+        assert data['pages'] >= 1
+        assert data['steps'] >= data['pages']
+        assert data['bytes'] == data['pages'] * data['page_size']
+        
+        conn = sqlite3.connect(data['path'])
+        count = conn.execute('SELECT COUNT(*) FROM contacts').fetchone()[0]
+        conn.close()
+        assert count == len(sample_contacts)
+    
+    def test_backup_restarts_under_writes(self, client, sample_contacts, tmp_path):
+        """Тест завершения бэкапа, который перезапускается из-за записи"""
+        import server
+        writer = server.connect_db()
+        writer.execute('CREATE TABLE filler (data TEXT)')
+        writer.executemany('INSERT INTO filler VALUES (?)', [('x' * 1000,) for _ in range(50)])
+        writer.commit()
+        
+        def write_during_backup(done, total):
+            writer.execute('INSERT INTO filler VALUES (?)', ('y',))
+            writer.commit()
+        
+        try:
+            result = server.backup_db(str(tmp_path / 'copy.db'), pages=1, sleep=0,
+                                      progress=write_during_backup, max_restarts=2)
+        finally:
+            writer.close()
+        assert result['restarts'] == 3
+        assert result['single_step_fallback'] is True
+        conn = sqlite3.connect(result['path'])
+        count = conn.execute('SELECT COUNT(*) FROM contacts').fetchone()[0]
+        conn.close()
+        assert count == len(sample_contacts)
+    
+    def test_backup_fallback_does_not_block_writers(self, client, tmp_path):
+        """Тест того, что копирование одним шагом не блокирует запись (WAL)"""
+        import threading
+        import time
+        import server
+        filler = server.connect_db()
+        filler.execute('CREATE TABLE filler (data TEXT)')
+        filler.executemany('INSERT INTO filler VALUES (?)', [('x' * 4000,) for _ in range(2000)])
+        filler.commit()
+        filler.close()
+        
+        stop = threading.Event()
+        latencies = []
+        errors = []
+        
+        def writer():
+            conn = sqlite3.connect(server.DB_PATH, timeout=0)
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    conn.execute('INSERT INTO filler VALUES (?)', ('y',))
+                    conn.commit()
+                except sqlite3.OperationalError as e:
+                    errors.append(str(e))
+                latencies.append(time.perf_counter() - started)
+                time.sleep(0.001)
+            conn.close()
+        
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            result = server.backup_db(str(tmp_path / 'copy.db'), pages=8, sleep=0.005, max_restarts=1)
+        finally:
+            stop.set()
+            thread.join()
+        assert result['single_step_fallback'] is True
+        assert errors == []
+        assert max(latencies) < 0.5
+    
+    def test_backup_cli_missing_database(self, client, tmp_path, monkeypatch, capsys):
+        """Тест отказа CLI, если исходной базы нет, без создания пустого файла"""
+        import server
+        missing = tmp_path / 'missing.db'
+        monkeypatch.setattr(server, 'DB_PATH', str(missing))
+        with pytest.raises(SystemExit) as exc:
+            server.main(['backup', str(tmp_path / 'copy.db')])
+        assert exc.value.code == 1
+        assert not missing.exists()
+        assert not (tmp_path / 'copy.db').exists()
+        assert 'не найдена' in capsys.readouterr().err
+    
+    def test_backup_cli_memory_backend(self, client, tmp_path, monkeypatch):
+        """Тест отказа CLI для хранилища в памяти"""
+        import server
+        monkeypatch.setattr(server, 'repository', MemoryRepository())
+        with pytest.raises(SystemExit) as exc:
+            server.main(['backup', str(tmp_path / 'copy.db')])
+        assert exc.value.code == 1
+        assert not (tmp_path / 'copy.db').exists()
+    
+    def test_backup_body_not_object(self, client):
+        """Тест бэкапа с телом, которое не является JSON-объектом"""
+        response = client.post('/api/admin/backup',
+                              data=json.dumps([1]),
+                              content_type='application/json')
+        assert response.status_code == 400
+        assert 'error' in response.get_json()
+    
+    def test_backup_invalid_filename(self, client):
+        """Тест бэкапа с путём вместо имени файла"""
+        response = client.post('/api/admin/backup',
+                              data=json.dumps({'filename': '../evil.db'}),
+                              content_type='application/json')
+        assert response.status_code == 400
+        data = response.get_json()
+        assert 'error' in data
+    
+    def test_backup_invalid_pages(self, client):
+        """Тест бэкапа с некорректным размером шага"""
+        response = client.post('/api/admin/backup',
+                              data=json.dumps({'pages': 0}),
+                              content_type='application/json')
+        assert response.status_code == 400
+    
+    def test_backup_admin_token(self, client, monkeypatch):
+        """Тест проверки токена администратора"""
+        import server
+        monkeypatch.setattr(server, 'ADMIN_TOKEN', 'secret')
+        response = client.post('/api/admin/backup')
+        assert response.status_code == 403
+
+
+@pytest.mark.parametrize('client', ['sqlite'], indirect=True)
+class TestSlowQueries:
+    """Тесты для журнала медленных запросов"""
+    
+    def test_slow_queries_captured(self, client, sample_contacts, monkeypatch):
+        """Тест фиксации запросов выше порога вместе с планом"""
+        from server import slow_query_log
+        slow_query_log.reset()
+        monkeypatch.setattr(slow_query_log, 'threshold_ms', 0)
+        client.get('/api/contacts')
+        
+        response = client.get('/api/admin/slow-queries')
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['total_statements'] >= 1
+        select = next(s for s in data['slow_statements'] if 'ORDER BY is_favorite' in s['sql'])
+        assert select['count'] == 1
+        assert select['plan']
+        assert select['last_params'] == []
+    
+    def test_fast_queries_not_logged(self, client, sample_contacts, monkeypatch):
+        """Тест того, что быстрые запросы не попадают в журнал"""
+        from server import slow_query_log
+        slow_query_log.reset()
+        monkeypatch.setattr(slow_query_log, 'threshold_ms', 10 ** 6)
+        client.get('/api/contacts')
+        data = client.get('/api/admin/slow-queries').get_json()
+        assert data['total_statements'] >= 1
+        assert data['slow_statements'] == []
+    
+    def test_reset_slow_queries(self, client, sample_contacts, monkeypatch):
+        """Тест сброса статистики"""
+        from server import slow_query_log
+        monkeypatch.setattr(slow_query_log, 'threshold_ms', 0)
+        client.get('/api/contacts')
+        response = client.delete('/api/admin/slow-queries')
+        assert response.status_code == 200
+        data = client.get('/api/admin/slow-queries').get_json()
+        assert data['slow_statements'] == []
+    
+    SLOW_ROWS_SQL = ('WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 10) '
+                     'SELECT slow(i) FROM n')
+    
+    @pytest.fixture
+    def slow_conn(self, client, monkeypatch):
+        """Соединение, в котором каждая строка результата вычисляется 20 мс"""
+        import time
+        import server
+        server.slow_query_log.reset()
+        monkeypatch.setattr(server.slow_query_log, 'threshold_ms', 100)
+        conn = server.connect_db()
+        conn.create_function('slow', 1, lambda value: time.sleep(0.02) or value)
+        yield conn
+        conn.close()
+    
+    def _logged(self):
+        from server import slow_query_log
+        return next((s for s in slow_query_log.snapshot()['slow_statements']
+                     if s['sql'] == self.SLOW_ROWS_SQL), None)
+    
+    def test_fetch_time_counted(self, slow_conn):
+        """Тест учёта времени чтения строк: execute вычисляет только первую строку"""
+        cursor = slow_conn.cursor()
+        cursor.execute(self.SLOW_ROWS_SQL)
+        assert self._logged() is None
+        assert len(cursor.fetchall()) == 10
+        logged = self._logged()
+        assert logged is not None
+        assert logged['max_ms'] >= 150
+        assert logged['plan']
+    
+    def test_iteration_time_counted(self, slow_conn):
+        """Тест учёта времени при переборе курсора"""
+        assert len(list(slow_conn.execute(self.SLOW_ROWS_SQL))) == 10
+        assert self._logged()['count'] == 1
+    
+    def test_partial_read_recorded_on_close(self, slow_conn):
+        """Тест записи недочитанного результата при закрытии соединения"""
+        cursor = slow_conn.execute(self.SLOW_ROWS_SQL)
+        for _ in range(8):
+            cursor.fetchone()
+        assert self._logged() is None
+        slow_conn.close()
+        logged = self._logged()
+        assert logged['count'] == 1
+        assert logged['max_ms'] >= 100
+        assert not logged['plan'][0].startswith('EXPLAIN недоступен')
+
+
+class TestProfiling:
+    """Тесты для профилирования запросов"""
+    
+    @pytest.fixture
+    def profiling(self, client, monkeypatch):
+        import server
+        monkeypatch.setattr(server.app, 'wsgi_app', server.app.wsgi_app)
+        server.profile_store.clear()
+        server.enable_profiling(sample_every=0, keep=2)
+        yield server.profile_store
+        server.profile_store.clear()
+    
+    def test_profile_by_header(self, client, sample_contacts, profiling):
+        """Тест профилирования запроса по заголовку"""
+        client.get('/api/contacts')
+        assert profiling.list() == []
+        response = client.get('/api/contacts', headers={'X-Profile': '1'})
+        assert response.status_code == 200
+        
+        profiles = client.get('/api/admin/profiles').get_json()
+        assert len(profiles) == 1
+        assert profiles[0]['path'] == '/api/contacts'
+        assert profiles[0]['status'] == 200
+        
+        profile_id = profiles[0]['id']
+        text = client.get(f'/api/admin/profiles/{profile_id}').get_data(as_text=True)
+        assert 'get_contacts' in text
+        collapsed = client.get(f'/api/admin/profiles/{profile_id}?format=collapsed').get_data(as_text=True)
+        assert any('get_contacts' in line for line in collapsed.splitlines())
+        dump = client.get(f'/api/admin/profiles/{profile_id}?format=pstats')
+        assert dump.content_type == 'application/octet-stream'
+    
+    def test_profile_ring_buffer(self, client, profiling):
+        """Тест ограничения количества хранимых профилей"""
+        for _ in range(3):
+            client.get('/api/contacts', headers={'X-Profile': '1'})
+        profiles = client.get('/api/admin/profiles').get_json()
+        assert len(profiles) == 2
+        assert client.get(f'/api/admin/profiles/{profiles[-1]["id"] - 1}').status_code == 404
+    
+    def test_profile_sampling(self, client, profiling):
+        """Тест профилирования каждого N-го запроса"""
+        import server
+        server.app.wsgi_app.sample_every = 2
+        for _ in range(4):
+            client.get('/api/contacts')
+        assert len(profiling.list()) == 2
+    
+    def test_profile_skipped_when_busy(self, client, profiling):
+        """Тест обслуживания запроса без профилирования, пока идёт другой профиль"""
+        import server
+        middleware = server.app.wsgi_app
+        middleware._active.acquire()
+        try:
+            response = client.get('/api/contacts', headers={'X-Profile': '1'})
+        finally:
+            middleware._active.release()
+        assert response.status_code == 200
+        assert profiling.list() == []
+        assert middleware.skipped == 1
+    
+    def test_profile_skipped_when_enable_fails(self, client, profiling, monkeypatch):
+        """Тест обслуживания запроса, если cProfile не удалось запустить"""
+        import cProfile
+        
+        def busy(self):
+            raise ValueError('Another profiling tool is already active')
+        
+        monkeypatch.setattr(cProfile.Profile, 'enable', busy)
+        response = client.get('/api/contacts', headers={'X-Profile': '1'})
+        assert response.status_code == 200
+        assert profiling.list() == []
+    
+    def test_profile_unknown_format(self, client, profiling):
+        """Тест запроса профиля в неизвестном формате"""
+        client.get('/api/contacts', headers={'X-Profile': '1'})
+        profile_id = profiling.list()[0]['id']
+        response = client.get(f'/api/admin/profiles/{profile_id}?format=svg')
+        assert response.status_code == 400
+
+
+class TestCompressionAndCaching:
+    """Тесты для сжатия ответов и кэширования статики"""
+    
+    def test_large_api_response_gzip(self, client):
+        """Тест сжатия большого ответа API"""
+        import gzip
+        for i in range(30):
+            client.post('/api/contacts',
+                        data=json.dumps({'name': f'Контакт {i}', 'phone': f'+7 (999) 000-00-{i:02d}'}),
+                        content_type='application/json')
+        plain = client.get('/api/contacts')
+        assert 'Content-Encoding' not in plain.headers
+        
+        response = client.get('/api/contacts', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert len(response.data) < len(plain.data)
+        assert json.loads(gzip.decompress(response.data)) == plain.get_json()
+    
+    def test_small_api_response_not_compressed(self, client):
+        """Тест того, что маленькие ответы не сжимаются"""
+        response = client.get('/api/contacts', headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in response.headers
+        assert response.get_json() == []
+    
+    def test_compress_stream(self):
+        """Тест потокового сжатия"""
+        import gzip
+        from compression import compress_stream
+        chunks = [b'[', '{"name": "Иван"}'.encode('utf-8') * 100, b']']
+        compressed = list(compress_stream(iter(chunks), 'gzip'))
+        assert len(compressed) >= len(chunks)
+        assert gzip.decompress(b''.join(compressed)) == b''.join(chunks)
+    
+    def test_index_fingerprinted_and_precompressed(self, client):
+        """Тест главной страницы: URL статики с хэшем и предварительное сжатие"""
+        import gzip
+        import server
+        response = client.get('/')
+        assert response.status_code == 200
+        html = response.get_data(as_text=True)
+        assert f'/static/script.js?v={server.asset_hashes["script.js"]}' in html
+        assert f'/static/styles.css?v={server.asset_hashes["styles.css"]}' in html
+        assert response.headers['Cache-Control'] == 'no-cache'
+        
+        compressed = client.get('/', headers={'Accept-Encoding': 'gzip'})
+        assert compressed.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(compressed.data).decode('utf-8') == html
+        assert compressed.headers['ETag'] != response.headers['ETag']
+        assert client.get('/', headers={'Accept-Encoding': 'gzip',
+                                        'If-None-Match': compressed.headers['ETag']}).status_code == 304
+        
+        cached = client.get('/', headers={'If-None-Match': response.headers['ETag']})
+        assert cached.status_code == 304
+    
+    def test_static_immutable_cache(self, client):
+        """Тест долгого кэширования статики по URL с хэшем"""
+        import server
+        digest = server.asset_hashes['script.js']
+        response = client.get(f'/static/script.js?v={digest}')
+        assert response.status_code == 200
+        assert 'immutable' in response.headers['Cache-Control']
+        response.close()
+        
+        stale = client.get('/static/script.js?v=outdated')
+        assert 'immutable' not in stale.headers.get('Cache-Control', '')
+        stale.close()
+
+
+class TestRateLimiting:
+    """Тесты для ограничения частоты запросов и сброса нагрузки"""
+    
+    def test_write_rate_limited(self, client, monkeypatch):
+        """Тест ответа 429 с Retry-After при превышении лимита записи"""
+        import server
+        monkeypatch.setattr(server, 'rate_limiter', RateLimiter({'write': (0.5, 2)}))
+        statuses = []
+        for i in range(3):
+            response = client.post('/api/contacts',
+                                   data=json.dumps({'name': f'Контакт {i}', 'phone': '+7 (999) 123-45-67'}),
+                                   content_type='application/json')
+            statuses.append(response.status_code)
+        assert statuses == [201, 201, 429]
+        assert response.headers['Retry-After'] == '2'
+        assert 'error' in response.get_json()
+        
+        assert client.get('/api/contacts').status_code == 200
+        stats = client.get('/api/admin/limits').get_json()
+        assert stats['rate']['rejected'] == {'write': 1}
+        assert stats['rate']['allowed'] == {'write': 2}
+    
+    def test_search_limited_separately(self, client, monkeypatch):
+        """Тест отдельного лимита для поиска"""
+        import server
+        monkeypatch.setattr(server, 'rate_limiter', RateLimiter({'search': (1, 1)}))
+        assert client.get('/api/contacts?search=иван').status_code == 200
+        assert client.get('/api/contacts?search=иван').status_code == 429
+        assert client.get('/api/contacts').status_code == 200
+    
+    def test_load_shedding(self, client, monkeypatch):
+        """Тест ответа 503 при исчерпании лимита параллельных запросов"""
+        import server
+        limiter = ConcurrencyLimiter(1)
+        monkeypatch.setattr(server, 'db_limiter', limiter)
+        assert limiter.acquire()
+        response = client.get('/api/contacts')
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+        limiter.release()
+        
+        assert client.get('/api/contacts').status_code == 200
+        stats = limiter.stats()
+        assert stats['in_flight'] == 0
+        assert stats['shed'] == 1
+    
+    def test_zero_means_unlimited(self):
+        """Тест того, что 0 отключает соответствующее ограничение"""
+        limiter = RateLimiter({'write': (0, 0), 'search': (1, 1)})
+        assert all(limiter.check('a', 'write') == 0 for _ in range(100))
+        assert 'write' not in limiter.stats()['limits']
+        
+        concurrency = ConcurrencyLimiter(0)
+        assert all(concurrency.acquire() for _ in range(100))
+        for _ in range(100):
+            concurrency.release()
+        assert concurrency.stats()['in_flight'] == 0
+    
+    def test_invalid_limits_rejected(self):
+        """Тест отказа при некорректных настройках"""
+        with pytest.raises(ValueError):
+            RateLimiter({'write': (-1, 10)})
+        with pytest.raises(ValueError):
+            RateLimiter({'write': (1, 0)})
+        with pytest.raises(ValueError):
+            ConcurrencyLimiter(-1)
+        with pytest.raises(ValueError):
+            ConcurrencyLimiter(1, wait=-1)
+    
+    def test_token_bucket_refill(self):
+        """Тест пополнения ведра токенов со временем"""
+        now = [0.0]
+        limiter = RateLimiter({'write': (2, 1)}, clock=lambda: now[0])
+        assert limiter.check('a', 'write') == 0
+        assert limiter.check('a', 'write') == pytest.approx(0.5)
+        assert limiter.check('b', 'write') == 0
+        now[0] = 0.5
+        assert limiter.check('a', 'write') == 0
+
+
+class TestLoadGenerator:
+    """Тесты для генератора нагрузки"""
+    
+    def test_run_load_in_process(self, client):
+        """Тест смешанной нагрузки через тестовый клиент Flask"""
+        from loadgen import InProcessClient, parse_mix, run_load
+        stats = run_load(InProcessClient(app), parse_mix('search=5,add=2,delete=1,favorite=1,reorder=1'),
+                         concurrency=2, requests=60, prefill=5, seed=1)
+        summary = stats.summary()
+        assert summary['requests'] >= 60
+        assert 'search' in summary['endpoints']
+        for entry in summary['endpoints'].values():
+            assert set(entry['statuses']) <= {'200', '201', '404'}
+            assert entry['locked'] == 0
+            assert entry['p50_ms'] <= entry['p99_ms'] <= entry['max_ms']
+    
+    def test_favorite_does_not_race_with_delete(self, client):
+        """Тест отсутствия 404 из-за гонки избранного и удаления в самом генераторе"""
+        from loadgen import InProcessClient, parse_mix, run_load
+        stats = run_load(InProcessClient(app), parse_mix('favorite=5,delete=5,add=1'),
+                         concurrency=4, requests=200, prefill=10, seed=2)
+        for entry in stats.summary()['endpoints'].values():
+            assert entry['errors'] == 0
+    
+    def test_run_load_leaves_existing_contacts_alone(self, client, sample_contacts):
+        """Тест того, что генератор не меняет чужие контакты и удаляет свои"""
+        from loadgen import InProcessClient, parse_mix, run_load
+        before = client.get('/api/contacts').get_json()
+        stats = run_load(InProcessClient(app), parse_mix('reorder=3,add=2,favorite=1,delete=1'),
+                         concurrency=2, requests=40, prefill=5, seed=3)
+        assert stats.summary()['endpoints']['reorder']['count'] > 0
+        assert client.get('/api/contacts').get_json() == before
+    
+    def test_in_process_memory_uses_separate_repository(self, tmp_path, monkeypatch):
+        """Тест того, что режим внутри процесса не трогает файл снимка"""
+        import server
+        from loadgen import make_in_process_client
+        snapshot = tmp_path / 'snapshot.json'
+        live = MemoryRepository(str(snapshot))
+        monkeypatch.setattr(server, 'repository', live)
+        monkeypatch.setattr(server, 'DB_PATH', server.DB_PATH)
+        make_in_process_client(str(tmp_path / 'load.db'), False)
+        assert server.repository is not live
+        assert server.repository.snapshot_path is None
+        server.repository.close()
+        assert not snapshot.exists()
+    
+    def test_parse_mix(self):
+        """Тест разбора смеси операций"""
+        from loadgen import parse_mix
+        assert parse_mix('search=3, add') == {'search': 3.0, 'add': 1.0}
+        with pytest.raises(ValueError):
+            parse_mix('upload=1')
+        with pytest.raises(ValueError):
+            parse_mix('search=0')
+    
+    def test_percentile(self):
+        """Тест вычисления перцентилей"""
+        from loadgen import percentile
+        values = list(range(1, 101))
+        assert percentile(values, 50) == 50
+        assert percentile(values, 99) == 99
+        assert percentile(values, 100) == 100
+        assert percentile([], 50) is None
+
+
+class TestMemoryRepository:
+    """Тесты для хранилища в памяти"""
+    
+    def test_incomplete_repository_rejected(self):
+        """Тест того, что хранилище без всех операций нельзя создать"""
+        class ReadOnlyRepository(ContactRepository):
+            def init(self):
+                pass
+            
+            def list_contacts(self):
+                return []
+        
+        with pytest.raises(TypeError):
+            ReadOnlyRepository()
+    
+    def test_order_and_search(self):
+        """Тест порядка (избранные первыми) и поиска"""
+        repository = MemoryRepository()
+        repository.init()
+        first = repository.add('Борис', '+7 (999) 111-11-11')
+        second = repository.add('Алла', '+7 (999) 222-22-22', True)
+        third = repository.add('Вера', '+7 (999) 333-33-33')
+        assert [c['id'] for c in repository.list_contacts()] == [second['id'], first['id'], third['id']]
+        
+        repository.reorder([third['id'], first['id']])
+        assert [c['id'] for c in repository.list_contacts()] == [second['id'], third['id'], first['id']]
+        
+        repository.toggle_favorite(second['id'])
+        assert repository.list_contacts()[0]['id'] == third['id']
+        
+        assert [c['id'] for c in repository.search('вера')] == [third['id']]
+        assert [c['id'] for c in repository.search('2222')] == [second['id']]
+    
+    def test_snapshot_roundtrip(self, tmp_path):
+        """Тест сохранения и загрузки снимка"""
+        path = str(tmp_path / 'snapshot.json')
+        repository = MemoryRepository(path, snapshot_interval=3600)
+        repository.init()
+        kept = repository.add('Иван', '+7 (999) 111-22-33', True)
+        removed = repository.add('Петр', '+7 (999) 222-33-44')
+        repository.delete(removed['id'])
+        repository.close()
+        
+        restored = MemoryRepository(path)
+        restored.init()
+        assert restored.list_contacts() == [kept]
+        assert restored.add('Мария', '+7 (999) 333-44-55')['id'] == removed['id'] + 1
+    
+    def test_writes_do_not_snapshot_inline(self, tmp_path):
+        """Тест того, что запись не сохраняет снимок в потоке запроса"""
+        path = tmp_path / 'snapshot.json'
+        repository = MemoryRepository(str(path), snapshot_interval=0)
+        repository.init()
+        repository.add('Иван', '+7 (999) 111-22-33')
+        assert not path.exists()
+    
+    def test_background_snapshot(self, tmp_path):
+        """Тест периодического снимка фоновым потоком"""
+        import time
+        path = tmp_path / 'snapshot.json'
+        repository = MemoryRepository(str(path), snapshot_interval=0.01)
+        repository.init()
+        thread = repository.start_background_snapshots()
+        try:
+            repository.add('Иван', '+7 (999) 111-22-33')
+            deadline = time.monotonic() + 5
+            while not path.exists() and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert json.loads(path.read_text(encoding='utf-8'))['contacts'][0]['name'] == 'Иван'
+        finally:
+            repository.close()
+            thread.join(timeout=5)
+        assert not thread.is_alive()
+
+
 class TestValidatePhone:
     """Тесты для функции валидации телефона"""
     